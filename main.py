@@ -1,13 +1,35 @@
-from fastapi import FastAPI, HTTPException, Security, Depends
+from fastapi import FastAPI, HTTPException, Request, Security
 from fastapi.security.api_key import APIKeyHeader
-from youtube_transcript_api import YouTubeTranscriptApi
-from youtube_transcript_api._errors import NoTranscriptFound, VideoUnavailable, TranscriptsDisabled
-from youtube_transcript_api.formatters import JSONFormatter, TextFormatter, WebVTTFormatter, SRTFormatter
+from youtube_transcript_api._errors import (
+    NoTranscriptFound,
+    VideoUnavailable,
+    TranscriptsDisabled,
+    NoTranscriptAvailable,
+    TooManyRequests,
+    YouTubeRequestFailed,
+    FailedToCreateConsentCookie,
+    InvalidVideoId,
+)
 from enum import Enum
-from fastapi.responses import Response
+from typing import NamedTuple
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+from async_lru import alru_cache
+from cachetools import TTLCache
+from html import unescape
+from lxml import etree
+import numpy as np
+import orjson
+from yarl import URL
+import aiohttp
+import asyncio
+import gzip
+import hmac
 import os
+import re
 
 load_dotenv()
 
@@ -17,6 +39,114 @@ class TranscriptFormat(str, Enum):
     WEBVTT = "webvtt"
     SRT = "srt"
 
+class Transcript(NamedTuple):
+    """
+    Transcript segments stored column-wise: texts, start times and durations.
+    """
+    texts: list[str]
+    starts: np.ndarray
+    durations: np.ndarray
+
+    def segments(self) -> list[dict]:
+        return [
+            {"text": text, "start": start, "duration": duration}
+            for text, start, duration in zip(self.texts, self.starts.tolist(), self.durations.tolist())
+        ]
+
+class BatchRequest(BaseModel):
+    video_ids: list[str] = Field(min_length=1, max_length=100)
+    language: str = "en"
+
+STREAM_CHUNK_LINES = 256
+
+class _StreamingFormatter:
+    """
+    Yields a transcript as encoded chunks of STREAM_CHUNK_LINES segments, so
+    that it can be sent while it is being rendered.
+    """
+    def iter_transcript(self, transcript):
+        raise NotImplementedError
+
+    def format_transcript(self, transcript):
+        return b"".join(self.iter_transcript(transcript))
+
+class StreamingTextFormatter(_StreamingFormatter):
+    def iter_transcript(self, transcript):
+        # One join and one encode per chunk rather than one per segment
+        texts = transcript.texts
+        for i in range(0, len(texts), STREAM_CHUNK_LINES):
+            yield (b"\n" if i else b"") + "\n".join(texts[i:i + STREAM_CHUNK_LINES]).encode()
+
+class _VectorizedCuesFormatter(_StreamingFormatter):
+    """
+    Computes all cue timestamps of a transcript in one NumPy pass instead of
+    a divmod chain per segment, then renders cues from bytes templates.
+    """
+    HEADER = b""
+    TIMESTAMP = b""
+
+    def iter_transcript(self, transcript):
+        count = len(transcript.texts)
+        # Row 0 holds cue starts and row 1 cue ends, so a single pass converts both
+        times = np.empty((2, count), np.float64)
+        times[0] = transcript.starts
+        np.add(transcript.starts, transcript.durations, out=times[1])
+        # A cue is cut short when the next one starts before it ends
+        np.minimum(times[1, :-1], times[0, 1:], out=times[1, :-1])
+
+        timestamps = self._timestamps(times.ravel())
+        buffer = bytearray(self.HEADER)
+        for i, (start, end, text) in enumerate(zip(timestamps[:count], timestamps[count:], transcript.texts)):
+            if i:
+                if i % STREAM_CHUNK_LINES == 0:
+                    yield bytes(buffer)
+                    buffer.clear()
+                buffer += b"\n\n"
+            buffer += self._format_cue(i, start, end, text.encode())
+        buffer += b"\n"
+        yield bytes(buffer)
+
+    def _timestamps(self, times):
+        seconds = times.astype(np.int64)
+        ms = np.round((times - seconds) * 1000, 2).astype(np.int64)
+        hours, remainder = np.divmod(seconds, 3600)
+        mins, secs = np.divmod(remainder, 60)
+        template = self.TIMESTAMP
+        return [
+            template % parts
+            for parts in zip(hours.tolist(), mins.tolist(), secs.tolist(), ms.tolist())
+        ]
+
+    def _format_cue(self, i, start, end, text):
+        raise NotImplementedError
+
+class VectorizedWebVTTFormatter(_VectorizedCuesFormatter):
+    HEADER = b"WEBVTT\n\n"
+    TIMESTAMP = b"%02d:%02d:%02d.%03d"
+
+    def _format_cue(self, i, start, end, text):
+        return b"%s --> %s\n%s" % (start, end, text)
+
+class VectorizedSRTFormatter(_VectorizedCuesFormatter):
+    TIMESTAMP = b"%02d:%02d:%02d,%03d"
+
+    def _format_cue(self, i, start, end, text):
+        return b"%d\n%s --> %s\n%s" % (i + 1, start, end, text)
+
+# JSON is rendered by orjson in one call rather than streamed
+FORMATTERS = {
+    TranscriptFormat.TEXT: StreamingTextFormatter(),
+    TranscriptFormat.WEBVTT: VectorizedWebVTTFormatter(),
+    TranscriptFormat.SRT: VectorizedSRTFormatter()
+}
+
+CONTENT_TYPES = {
+    TranscriptFormat.JSON: "application/json",
+    TranscriptFormat.TEXT: "text/plain",
+    TranscriptFormat.WEBVTT: "text/vtt",
+    TranscriptFormat.SRT: "text/plain"
+}
+
 app = FastAPI(
     title="YouTube Transcript API",
     description="Fetch video transcripts via an API",
@@ -27,7 +157,8 @@ app = FastAPI(
     },
     license_info={
         "name": "MIT",
-    }
+    },
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -39,93 +170,295 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses; cached transcripts are stored precompressed instead
+GZIP_MINIMUM_SIZE = 1024
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
+# YouTube HTTP client
+WATCH_URL = "https://www.youtube.com/watch?v={video_id}"
+CONSENT_FORM = 'action="https://consent.youtube.com/s"'
+HTML_TAG_RE = re.compile(r"<[^>]*>")
+VIDEO_ID_RE = re.compile(r"[A-Za-z0-9_-]{11}")
+
+@app.on_event("startup")
+async def open_http_client():
+    app.state.http = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=200, limit_per_host=50),
+        headers={"Accept-Language": "en-US"},
+        timeout=aiohttp.ClientTimeout(total=30),
+    )
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await app.state.http.close()
+
+async def _http_get(url: str, video_id: str) -> bytes:
+    try:
+        async with app.state.http.get(url, raise_for_status=True) as response:
+            return await response.read()
+    except aiohttp.ClientResponseError as e:
+        raise YouTubeRequestFailed(video_id, e)
+
+async def _fetch_video_html(video_id: str) -> str:
+    url = WATCH_URL.format(video_id=video_id)
+    html = unescape((await _http_get(url, video_id)).decode())
+    if CONSENT_FORM in html:
+        match = re.search('name="v" value="(.*?)"', html)
+        if match is None:
+            raise FailedToCreateConsentCookie(video_id)
+        app.state.http.cookie_jar.update_cookies(
+            {"CONSENT": "YES+" + match.group(1)}, URL("https://www.youtube.com")
+        )
+        html = unescape((await _http_get(url, video_id)).decode())
+        if CONSENT_FORM in html:
+            raise FailedToCreateConsentCookie(video_id)
+    return html
+
+@alru_cache(maxsize=2048, ttl=600)
+async def fetch_caption_tracks(video_id: str) -> list[dict]:
+    """
+    Fetch the caption tracks of a video, manually created ones first.
+    """
+    html = await _fetch_video_html(video_id)
+    splitted_html = html.split('"captions":')
+    if len(splitted_html) <= 1:
+        if 'class="g-recaptcha"' in html:
+            raise TooManyRequests(video_id)
+        if '"playabilityStatus":' not in html:
+            raise VideoUnavailable(video_id)
+        raise TranscriptsDisabled(video_id)
+
+    captions_json = orjson.loads(
+        splitted_html[1].split(',"videoDetails')[0].replace("\n", "")
+    ).get("playerCaptionsTracklistRenderer")
+    if captions_json is None:
+        raise TranscriptsDisabled(video_id)
+    if "captionTracks" not in captions_json:
+        raise NoTranscriptAvailable(video_id)
+
+    translatable = bool(captions_json.get("translationLanguages"))
+    manually_created, generated = {}, {}
+    for caption in captions_json["captionTracks"]:
+        is_generated = caption.get("kind", "") == "asr"
+        tracks = generated if is_generated else manually_created
+        tracks[caption["languageCode"]] = {
+            "language": caption["name"]["simpleText"],
+            "language_code": caption["languageCode"],
+            "is_generated": is_generated,
+            "is_translatable": translatable and caption.get("isTranslatable", False),
+            "url": caption["baseUrl"],
+        }
+    return list(manually_created.values()) + list(generated.values())
+
+async def fetch_transcript_xml(video_id: str, language: str) -> bytes:
+    """
+    Fetch the raw timedtext XML of a video transcript.
+    """
+    tracks = await fetch_caption_tracks(video_id)
+    for track in tracks:
+        if track["language_code"] == language:
+            return await _http_get(track["url"], video_id)
+    raise NoTranscriptFound(
+        video_id, [language], ", ".join(track["language_code"] for track in tracks)
+    )
+
+def parse_transcript(xml: bytes) -> Transcript:
+    texts, starts, durations = [], [], []
+    for element in etree.fromstring(xml):
+        if element.text is not None:
+            texts.append(HTML_TAG_RE.sub("", unescape(element.text)))
+            starts.append(float(element.get("start")))
+            durations.append(float(element.get("dur", "0.0")))
+    return Transcript(texts, np.array(starts, np.float64), np.array(durations, np.float64))
+
+# Transcripts never change once published, so both the parsed segments and
+# the formatted bodies are cached per process.
+@alru_cache(maxsize=4096, ttl=3600)
+async def _cached_fetch(video_id: str, language: str) -> Transcript:
+    return parse_transcript(await fetch_transcript_xml(video_id, language))
+
+# Formatted bodies are cached next to their gzip encoding, so that each one
+# is compressed once rather than by the middleware on every hit
+FORMATTED_CACHE = TTLCache(maxsize=8192, ttl=3600)
+
+def _cache_body(cache_key: tuple, body: bytes):
+    gzipped = gzip.compress(body) if len(body) >= GZIP_MINIMUM_SIZE else None
+    FORMATTED_CACHE[cache_key] = (body, gzipped)
+
+def _cached_response(request: Request, cached: tuple, media_type: str) -> Response:
+    body, gzipped = cached
+    if gzipped is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(
+            content=gzipped,
+            media_type=media_type,
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+        )
+    return Response(content=body, media_type=media_type)
+
+async def _stream_transcript(formatter: _StreamingFormatter, transcript: Transcript, cache_key: tuple):
+    """
+    Stream the formatted transcript and cache the full body once it has
+    been sent.
+    """
+    chunks = []
+    for chunk in formatter.iter_transcript(transcript):
+        chunks.append(chunk)
+        yield chunk
+    _cache_body(cache_key, b"".join(chunks))
+
 # API Key configuration
 API_KEY = os.getenv("API_KEY")
+_API_KEY_BYTES = API_KEY.encode() if API_KEY else None
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
 async def get_api_key(api_key_header: str = Security(api_key_header)):
-    if not API_KEY:
-        return None
-    if api_key_header == API_KEY:
+    if api_key_header and hmac.compare_digest(api_key_header.encode(), _API_KEY_BYTES):
         return api_key_header
     raise HTTPException(
         status_code=401,
         detail="Invalid API Key"
     )
 
+# Without a configured key the check is not wired into the routes at all
+API_KEY_DEPENDENCIES = [Security(get_api_key)] if _API_KEY_BYTES else []
+
 @app.get("/")
-def read_root():
+async def read_root():
     return {
         "message": "Welcome to the YouTube Transcript API",
         "description": "This API allows you to extract subtitles from YouTube videos",
         "endpoints": {
             "/transcript": "Get video subtitles (formats: json, text, webvtt, srt)",
-            "/transcripts": "List available subtitles for a video"
+            "/transcript/{format}": "Get video subtitles in the given format",
+            "/transcripts": "List available subtitles for a video",
+            "/transcripts/batch": "Get subtitles of several videos at once (POST)"
         },
         "documentation": "/docs"
     }
 
-@app.get("/transcript")
+# Known errors are answered with bodies encoded once at import instead of
+# raising HTTPException. Response objects are still built per request, as
+# middlewares mutate their headers.
+INVALID_VIDEO_ID = "Invalid video ID."
+TRANSCRIPT_NOT_FOUND = "Transcript not found for the specified language."
+VIDEO_UNAVAILABLE = "Video is unavailable."
+TRANSCRIPTS_DISABLED = "Transcripts are disabled for this video."
+
+ERROR_BODIES = {
+    detail: orjson.dumps({"detail": detail})
+    for detail in (INVALID_VIDEO_ID, TRANSCRIPT_NOT_FOUND, VIDEO_UNAVAILABLE, TRANSCRIPTS_DISABLED)
+}
+
+def _error_response(status_code: int, detail: str) -> Response:
+    return Response(
+        content=ERROR_BODIES[detail],
+        status_code=status_code,
+        media_type="application/json"
+    )
+
+def make_transcript_handler(format: TranscriptFormat):
+    """
+    Build the endpoint serving transcripts in a single format, so that the
+    formatter and content type are resolved once instead of per request.
+    """
+    media_type = CONTENT_TYPES[format]
+    # Hot globals bound as closure cells: endpoint default arguments would
+    # turn into query parameters
+    cache_body = _cache_body
+    cache_get = FORMATTED_CACHE.get
+    cached_response = _cached_response
+    fetch = _cached_fetch
+    response_class = Response
+    is_video_id = VIDEO_ID_RE.fullmatch
+    error_response = _error_response
+
+    if format == TranscriptFormat.JSON:
+        dumps = orjson.dumps
+
+        def respond(transcript: Transcript, cache_key: tuple) -> Response:
+            formatted_transcript = dumps(transcript.segments())
+            cache_body(cache_key, formatted_transcript)
+            return response_class(content=formatted_transcript, media_type=media_type)
+    else:
+        formatter = FORMATTERS[format]
+
+        def respond(transcript: Transcript, cache_key: tuple) -> Response:
+            return StreamingResponse(
+                _stream_transcript(formatter, transcript, cache_key),
+                media_type=media_type
+            )
+
+    async def get_formatted_transcript(
+        request: Request,
+        video_id: str,
+        language: str = "en"
+    ):
+        """
+        Fetch transcript for a given YouTube video ID and language.
+        """
+        if not is_video_id(video_id):
+            return error_response(400, INVALID_VIDEO_ID)
+        try:
+            cache_key = (video_id, language, format)
+            cached = cache_get(cache_key)
+            if cached is not None:
+                return cached_response(request, cached, media_type)
+
+            return respond(await fetch(video_id, language), cache_key)
+
+        except NoTranscriptFound:
+            return error_response(404, TRANSCRIPT_NOT_FOUND)
+        except VideoUnavailable:
+            return error_response(404, VIDEO_UNAVAILABLE)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    return get_formatted_transcript
+
+TRANSCRIPT_HANDLERS = {fmt: make_transcript_handler(fmt) for fmt in TranscriptFormat}
+
+for fmt, handler in TRANSCRIPT_HANDLERS.items():
+    app.add_api_route(
+        f"/transcript/{fmt.value}",
+        handler,
+        methods=["GET"],
+        dependencies=API_KEY_DEPENDENCIES,
+        name=f"get_transcript_{fmt.value}",
+        summary=f"Get Transcript ({fmt.value})"
+    )
+
+@app.get("/transcript", dependencies=API_KEY_DEPENDENCIES)
 async def get_transcript(
+    request: Request,
     video_id: str, 
     language: str = "en", 
-    format: TranscriptFormat = TranscriptFormat.JSON,
-    api_key: str = Depends(get_api_key)
+    format: TranscriptFormat = TranscriptFormat.JSON
 ):
     """
     Fetch transcript for a given YouTube video ID and language.
     Available formats: json, text, webvtt, srt
     """
-    try:
-        transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=[language])
-        
-        formatters = {
-            TranscriptFormat.JSON: JSONFormatter(),
-            TranscriptFormat.TEXT: TextFormatter(),
-            TranscriptFormat.WEBVTT: WebVTTFormatter(),
-            TranscriptFormat.SRT: SRTFormatter()
-        }
-        
-        formatter = formatters[format]
-        formatted_transcript = formatter.format_transcript(transcript)
-        
-        content_types = {
-            TranscriptFormat.JSON: "application/json",
-            TranscriptFormat.TEXT: "text/plain",
-            TranscriptFormat.WEBVTT: "text/vtt",
-            TranscriptFormat.SRT: "text/plain"
-        }
-        
-        return Response(
-            content=formatted_transcript,
-            media_type=content_types[format]
-        )
-        
-    except NoTranscriptFound:
-        raise HTTPException(status_code=404, detail="Transcript not found for the specified language.")
-    except VideoUnavailable:
-        raise HTTPException(status_code=404, detail="Video is unavailable.")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await TRANSCRIPT_HANDLERS[format](request, video_id, language)
 
-@app.get("/transcripts")
+@app.get("/transcripts", dependencies=API_KEY_DEPENDENCIES)
 async def list_transcripts(
-    video_id: str,
-    api_key: str = Depends(get_api_key)
+    video_id: str
 ):
     """
     List all available transcripts for a given YouTube video ID.
     """
+    if not VIDEO_ID_RE.fullmatch(video_id):
+        return _error_response(400, INVALID_VIDEO_ID)
     try:
-        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+        tracks = await fetch_caption_tracks(video_id)
         available_transcripts = []
         
-        for transcript in transcript_list:
+        for track in tracks:
             available_transcripts.append({
-                "language": transcript.language,
-                "language_code": transcript.language_code,
-                "is_generated": transcript.is_generated,
-                "is_translatable": transcript.is_translatable
+                "language": track["language"],
+                "language_code": track["language_code"],
+                "is_generated": track["is_generated"],
+                "is_translatable": track["is_translatable"]
             })
             
         return {
@@ -134,8 +467,62 @@ async def list_transcripts(
         }
         
     except TranscriptsDisabled:
-        raise HTTPException(status_code=404, detail="Transcripts are disabled for this video.")
+        return _error_response(404, TRANSCRIPTS_DISABLED)
     except VideoUnavailable:
-        raise HTTPException(status_code=404, detail="Video is unavailable.")
+        return _error_response(404, VIDEO_UNAVAILABLE)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+BATCH_CONCURRENCY = 32
+
+def _batch_error(error: BaseException) -> str:
+    if isinstance(error, InvalidVideoId):
+        return INVALID_VIDEO_ID
+    if isinstance(error, NoTranscriptFound):
+        return TRANSCRIPT_NOT_FOUND
+    if isinstance(error, VideoUnavailable):
+        return VIDEO_UNAVAILABLE
+    if isinstance(error, TranscriptsDisabled):
+        return TRANSCRIPTS_DISABLED
+    return str(error)
+
+@app.post("/transcripts/batch", dependencies=API_KEY_DEPENDENCIES)
+async def batch_transcripts(request: BatchRequest):
+    """
+    Fetch the transcripts of several YouTube videos concurrently.
+    A video that fails is reported with an error instead of failing the batch.
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def fetch(video_id: str) -> Transcript:
+        if not VIDEO_ID_RE.fullmatch(video_id):
+            raise InvalidVideoId(video_id)
+        async with semaphore:
+            return await _cached_fetch(video_id, request.language)
+
+    results = await asyncio.gather(
+        *(fetch(video_id) for video_id in request.video_ids),
+        return_exceptions=True
+    )
+
+    return {
+        "language": request.language,
+        "transcripts": [
+            {"video_id": video_id, "error": _batch_error(result)}
+            if isinstance(result, BaseException)
+            else {"video_id": video_id, "transcript": result.segments()}
+            for video_id, result in zip(request.video_ids, results)
+        ]
+    }
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WORKERS") or os.cpu_count())
+    )